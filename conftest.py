@@ -3,6 +3,33 @@
 import pytest
 import platform
 
+### Options ###
+
+
+def pytest_addoption(parser):
+    parser.addoption("--backend", choices=("both", "lxml", "etree"), default="both",
+                     help="cell writer implementation(s) to test (default: both)")
+
+
+def pytest_collection_modifyitems(config, items):
+    backend = config.getoption("--backend")
+    if backend == "both":
+        return
+
+    selected = []
+    deselected = []
+    for item in items:
+        callspec = getattr(item, "callspec", None)
+        if callspec is not None and callspec.params.get("write_cell_implementation", backend) != backend:
+            deselected.append(item)
+        else:
+            selected.append(item)
+
+    if deselected:
+        config.hook.pytest_deselected(items=deselected)
+        items[:] = selected
+
+
 ### Markers ###
 
 
@@ -10,6 +10,8 @@ from openpyxl.worksheet.formula import DataTableFormula, ArrayFormula
 from openpyxl.cell.rich_text import CellRichText
 from .formula_utils import prepare_spill_formula as _prepare_spill_formula
 
+_XML_SPACE = "{%s}space" % XML_NS
+
 
 def _set_attributes(cell, styled=None):
     """
@@ -20,18 +22,19 @@ def _set_attributes(cell, styled=None):
     if styled:
         attrs['s'] = f"{cell.style_id}"
 
-    if cell.data_type == "s":
+    data_type = cell.data_type
+    if data_type == "s":
         attrs['t'] = "inlineStr"
-    elif cell.data_type != 'f':
-        attrs['t'] = cell.data_type
-
-    # スピル数式の場合はcm属性を追加
-    if cell.data_type == "f" and getattr(cell, "_is_spill", False):
-        attrs['cm'] = "1"
+    elif data_type == 'f':
+        # スピル数式の場合はcm属性を追加
+        if getattr(cell, "_is_spill", False):
+            attrs['cm'] = "1"
+    else:
+        attrs['t'] = data_type
 
     value = cell._value
 
-    if cell.data_type == "d":
+    if data_type == "d":
         if hasattr(value, "tzinfo") and value.tzinfo is not None:
             raise TypeError("Excel does not support timezones in datetimes. "
                     "The tzinfo in the datetime/time object must be set to None.")
@@ -48,6 +51,34 @@ def _set_attributes(cell, styled=None):
     return value, attrs
 
 
+def _write_formula(el, cell, value):
+    """
+    Add the formula element to the cell and return the value to write
+    """
+    # 元のコードで処理していたArrayFormula/DataTableFormulaはそのまま残す
+    if isinstance(value, ArrayFormula):
+        attrib = dict(value)
+        value = value.text
+    elif isinstance(value, DataTableFormula):
+        attrib = dict(value)
+        value = None
+    else:
+        # スピル数式とLAMBDA/LET関数を統合処理
+        value, attrib = _prepare_spill_formula(value, cell)
+
+    formula = SubElement(el, 'f', attrib)
+    if value is not None and not attrib.get('t') == "dataTable":
+        formula.text = value[1:]
+
+        # スピル数式の場合、v要素に初期値を設定
+        if getattr(cell, "_is_spill", False):
+            value = "0"  # Excelはスピル数式の初期値として0または計算結果を期待
+        else:
+            value = None
+
+    return value
+
+
 def etree_write_cell(xf, worksheet, cell, styled=None):
 
     value, attributes = _set_attributes(cell, styled)
@@ -58,29 +89,7 @@ def etree_write_cell(xf, worksheet, cell, styled=None):
         return
 
     if cell.data_type == 'f':
-        attrib = {}
-        
-        # 元のコードで処理していたArrayFormula/DataTableFormulaはそのまま残す
-        if isinstance(value, ArrayFormula):
-            attrib = dict(value)
-            value = value.text
-        elif isinstance(value, DataTableFormula):
-            attrib = dict(value)
-            value = None
-        else:
-            # スピル数式とLAMBDA/LET関数を統合処理
-            value, spill_attrib = _prepare_spill_formula(value, cell)
-            attrib.update(spill_attrib)
-        
-        formula = SubElement(el, 'f', attrib)
-        if value is not None and not attrib.get('t') == "dataTable":
-            formula.text = value[1:]
-            
-            # スピル数式の場合、v要素に初期値を設定
-            if getattr(cell, "_is_spill", False):
-                value = "0"  # Excelはスピル数式の初期値として0または計算結果を期待
-            else:
-                value = None
+        value = _write_formula(el, cell, value)
 
     if cell.data_type == 's':
         if isinstance(value, CellRichText):
@@ -108,32 +117,18 @@ def lxml_write_cell(xf, worksheet, cell, styled=False):
         with xf.element("c", attributes):
             return
 
-    with xf.element('c', attributes):
-        if cell.data_type == 'f':
-            attrib = {}
-            
-            # 元のコードで処理していたArrayFormula/DataTableFormulaはそのまま残す
-            if isinstance(value, ArrayFormula):
-                attrib = dict(value)
-                value = value.text
-            elif isinstance(value, DataTableFormula):
-                attrib = dict(value)
-                value = None
-            else:
-                # スピル数式とLAMBDA/LET関数を統合処理
-                value, spill_attrib = _prepare_spill_formula(value, cell)
-                attrib.update(spill_attrib)
-            
-            with xf.element('f', attrib):
-                if value is not None and not attrib.get('t') == "dataTable":
-                    xf.write(value[1:])
-                    
-                    # スピル数式の場合、v要素に初期値を設定
-                    if getattr(cell, "_is_spill", False):
-                        value = "0"  # Excelはスピル数式の初期値として0または計算結果を期待
-                    else:
-                        value = None
+    if cell.data_type == 'f':
+        # Formula cells are built as a tree and written in one call rather
+        # than through nested xf.element() contexts
+        el = Element("c", attributes)
+        value = _write_formula(el, cell, value)
+        cell_content = SubElement(el, 'v')
+        if value is not None:
+            cell_content.text = safe_string(value)
+        xf.write(el)
+        return
 
+    with xf.element('c', attributes):
         if cell.data_type == 's':
             if isinstance(value, CellRichText):
                 el = value.to_tree()
@@ -143,7 +138,7 @@ def lxml_write_cell(xf, worksheet, cell, styled=False):
                     if isinstance(value, str):
                         attrs = {}
                         if value != value.strip():
-                            attrs["{%s}space" % XML_NS] = "preserve"
+                            attrs[_XML_SPACE] = "preserve"
                         el = Element("t", attrs) # lxml can't handle xml-ns
                         el.text = value
                         xf.write(el)
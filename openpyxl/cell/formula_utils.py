@@ -6,10 +6,55 @@ and LAMBDA/LET functions, adding appropriate prefixes.
 """
 
 import re
+import sys
+from functools import lru_cache
 from typing import Optional, Tuple, Dict, List, Any
 import uuid
 
 
+# Excel 365 new functions which need the _xlfn. prefix
+_XLFN_FUNCTIONS = frozenset((
+    'UNIQUE', 'SORTBY', 'SEQUENCE', 'RANDARRAY', 'XLOOKUP', 'XMATCH',
+    'VSTACK', 'HSTACK', 'TAKE', 'DROP', 'CHOOSEROWS', 'CHOOSECOLS', 'EXPAND',
+    'TOCOL', 'TOROW', 'WRAPCOLS', 'WRAPROWS', 'ARRAYTOTEXT', 'VALUETOTEXT',
+    'TEXTAFTER', 'TEXTBEFORE', 'TEXTSPLIT', 'REGEXEXTRACT', 'REGEXREPLACE',
+    'REGEXTEST', 'ISOMITTED', 'MAP', 'REDUCE', 'SCAN', 'BYCOL', 'BYROW',
+    'MAKEARRAY', 'PERCENTOF', 'TRIMRANGE', 'LAMBDA', 'LET', 'GROUPBY',
+    'PIVOTBY', 'CONCAT',
+))
+
+# Functions which need the double _xlfn._xlws. prefix
+_XLWS_FUNCTIONS = frozenset(('SORT', 'FILTER'))
+
+# Prefixes written in front of function and parameter names
+_XLFN_PREFIX = sys.intern('_xlfn.')
+_XLWS_PREFIX = sys.intern('_xlfn._xlws.')
+_XLPM_PREFIX = sys.intern('_xlpm.')
+_XLOP_PREFIX = sys.intern('_xlop.')
+_XLETA_PREFIX = sys.intern('_xleta.')
+_RESERVED_PREFIXES = (_XLPM_PREFIX, _XLOP_PREFIX, _XLETA_PREFIX, _XLFN_PREFIX)
+
+# Any call to one of the new functions, used to skip formulas quickly
+_NEW_FUNCTION_RE = re.compile(
+    r'(?:%s)\s*\(' % '|'.join(sorted(_XLFN_FUNCTIONS | _XLWS_FUNCTIONS)),
+    re.IGNORECASE,
+)
+
+_WORD_RE = re.compile(r'\w+')
+
+# Trimmed range references (.:. / :. / .:) with an optional sheet name
+_TRO_CELL = r'(\$?[A-Z]+\$?\d+|\$?[A-Z]+|\$?\d+)'
+_TRO_SHEET = r'([A-Za-z_][\w\.]*!)?'
+_TRO_ALL_RE = re.compile(_TRO_SHEET + _TRO_CELL + r'\.:\.' + _TRO_CELL)
+_TRO_TRAILING_RE = re.compile(_TRO_SHEET + _TRO_CELL + r':\.' + _TRO_CELL)
+_TRO_LEADING_RE = re.compile(_TRO_SHEET + _TRO_CELL + r'\.:' + _TRO_CELL)
+
+# Spill range references (A1#)
+_SPILL_REFERENCE_RE = re.compile(
+    r"(?P<sheet>(?:'[^']+'!|[A-Za-z_][\\w\.]*!)?)(?P<ref>\$?[A-Z]{1,3}\$?\d+|[A-Za-z_][\\w\.]*?)#"
+)
+
+
 def prepare_spill_formula(formula: str, cell: Any) -> Tuple[str, Dict[str, Any]]:
     """
     Process Excel 365 spill formulas and add appropriate prefixes
@@ -25,47 +70,71 @@ def prepare_spill_formula(formula: str, cell: Any) -> Tuple[str, Dict[str, Any]]
         return formula, {}
     
     try:
-        # Get formula body (excluding '=')
-        formula_body = formula[1:]
-        
-        # 1. Protect string literals
-        protected_formula, string_map = _protect_string_literals(formula_body)
-        
-        # 2. Protect array literals
-        protected_formula, array_map = _protect_array_literals(protected_formula)
-        
-        # 3. LAMBDA/LET unified processing (highest priority)
-        processed_formula = _process_lambda_let_unified(protected_formula)
-        
-        # 4. GROUPBY/PIVOTBY argument processing
-        processed_formula = _process_groupby_pivotby_args(processed_formula)
-        
-        # 5. Function name conversion
-        processed_formula = _add_function_prefixes(processed_formula)
-        
-        # 6. Special notation conversion
-        processed_formula = _convert_tro_notations(processed_formula)
-
-        # 7. Convert spill range shorthand (#) to ANCHORARRAY calls
-        processed_formula = _convert_spill_references(processed_formula)
+        final_formula = _prefix_formula(formula)
 
-        # 8. Restore array literals
-        processed_formula = _restore_array_literals(processed_formula, array_map)
-
-        # 9. Restore string literals
-        final_formula = _restore_string_literals(processed_formula, string_map)
-
-        # 10. Attribute setting
-        attributes = _determine_formula_attributes(final_formula, cell)
+        # Attribute setting
+        attributes = _determine_formula_attributes(final_formula[1:], cell)
         
-        # Return with '=' prefix
-        return '=' + final_formula, attributes
+        return final_formula, attributes
         
     except Exception:
         # Return original formula and empty attributes on error
         return formula, {}
 
 
+@lru_cache(maxsize=8192)
+def _prefix_formula(formula: str) -> str:
+    """
+    Add Excel 365 prefixes to a formula
+    
+    The result only depends on the formula text, so it is cached: the same
+    formula is usually repeated across many cells of a worksheet.
+    
+    Args:
+        formula: Excel formula string (starting with '=')
+    
+    Returns:
+        Converted formula string (starting with '=')
+    """
+    # Most formulas use neither new functions nor special notations
+    if ('#' not in formula and '.:' not in formula and ':.' not in formula
+            and _NEW_FUNCTION_RE.search(formula) is None):
+        return formula
+    
+    # Get formula body (excluding '=')
+    formula_body = formula[1:]
+    
+    # 1. Protect string literals
+    protected_formula, string_map = _protect_string_literals(formula_body)
+    
+    # 2. Protect array literals
+    protected_formula, array_map = _protect_array_literals(protected_formula)
+    
+    # 3. LAMBDA/LET unified processing (highest priority)
+    processed_formula = _process_lambda_let_unified(protected_formula)
+    
+    # 4. GROUPBY/PIVOTBY argument processing
+    processed_formula = _process_groupby_pivotby_args(processed_formula)
+    
+    # 5. Function name conversion
+    processed_formula = _add_function_prefixes(processed_formula)
+    
+    # 6. Special notation conversion
+    processed_formula = _convert_tro_notations(processed_formula)
+
+    # 7. Convert spill range shorthand (#) to ANCHORARRAY calls
+    processed_formula = _convert_spill_references(processed_formula)
+
+    # 8. Restore array literals
+    processed_formula = _restore_array_literals(processed_formula, array_map)
+
+    # 9. Restore string literals
+    final_formula = _restore_string_literals(processed_formula, string_map)
+    
+    # Return with '=' prefix
+    return '=' + final_formula
+
+
 def _protect_string_literals(formula: str) -> Tuple[str, Dict[str, str]]:
     """
     Temporarily replace string literals with placeholders
@@ -76,18 +145,33 @@ def _protect_string_literals(formula: str) -> Tuple[str, Dict[str, str]]:
     Returns:
         (Formula with placeholders, mapping of placeholders to original strings)
     """
+    segments = formula.split('"')
+    if len(segments) == 1:
+        return formula, {}
+
+    # An unterminated string is left as part of the formula text
+    if len(segments) % 2 == 0:
+        segments[-2:] = ['"'.join(segments[-2:])]
+
+    # Even segments are formula text, odd segments are string contents.
+    # An empty text segment between two strings is an escaped quote ("").
     string_map = {}
-    
-    def replace_string(match):
+    parts = [segments[0]]
+    literal = []
+    last = len(segments) - 1
+    for index in range(1, last, 2):
+        literal.append(segments[index])
+        text = segments[index + 1]
+        if not text and index + 1 < last:
+            continue
         # Generate unique placeholder
         placeholder = f"__STR_{uuid.uuid4().hex[:8]}__"
-        string_map[placeholder] = match.group(0)
-        return placeholder
-    
-    # Replace double-quoted strings
-    protected = re.sub(r'"(?:[^"]|"")*"', replace_string, formula)
-    
-    return protected, string_map
+        string_map[placeholder] = '"%s"' % '""'.join(literal)
+        literal = []
+        parts.append(placeholder)
+        parts.append(text)
+
+    return ''.join(parts), string_map
 
 
 def _restore_string_literals(formula: str, string_map: Dict[str, str]) -> str:
@@ -169,7 +253,7 @@ def _process_lambda_let_unified(formula: str, scope: Optional[Dict[str, str]] =
     while i < len(formula):
         # Detect LAMBDA function
         if _is_function_at(formula, i, 'LAMBDA'):
-            result.append('_xlfn.LAMBDA')
+            result.append(_XLFN_PREFIX + 'LAMBDA')
             i += 6  # Length of 'LAMBDA'
             
             # Parse arguments
@@ -193,12 +277,12 @@ def _process_lambda_let_unified(formula: str, scope: Optional[Dict[str, str]] =
                             # Remove brackets for optional parameters
                             clean_param = param[1:-1]
                             # Use _xlop. prefix for parameter definition, but _xlpm. for scope references
-                            new_scope[clean_param] = f'_xlpm.{clean_param}'
-                            processed_params.append(f'_xlop.{clean_param}')
+                            new_scope[clean_param] = _XLPM_PREFIX + clean_param
+                            processed_params.append(_XLOP_PREFIX + clean_param)
                         else:
                             # Regular parameter with _xlpm. prefix
-                            new_scope[param] = f'_xlpm.{param}'
-                            processed_params.append(f'_xlpm.{param}')
+                            new_scope[param] = _XLPM_PREFIX + param
+                            processed_params.append(_XLPM_PREFIX + param)
                 
                 # Add parameter part to result
                 if processed_params:
@@ -209,8 +293,6 @@ def _process_lambda_let_unified(formula: str, scope: Optional[Dict[str, str]] =
                 # Process body with new scope
                 if body:
                     processed_body = _process_lambda_let_unified(body, new_scope)
-                    # Replace variables in scope
-                    processed_body = _replace_variables_in_scope(processed_body, new_scope)
                     result.append(processed_body)
                 
                 result.append(')')
@@ -218,7 +300,7 @@ def _process_lambda_let_unified(formula: str, scope: Optional[Dict[str, str]] =
                 
         # Detect LET function
         elif _is_function_at(formula, i, 'LET'):
-            result.append('_xlfn.LET')
+            result.append(_XLFN_PREFIX + 'LET')
             i += 3  # Length of 'LET'
             
             # Parse arguments
@@ -239,10 +321,9 @@ def _process_lambda_let_unified(formula: str, scope: Optional[Dict[str, str]] =
                     if var_name:
                         # Process variable expression with current scope
                         processed_expr = _process_lambda_let_unified(var_expr, new_scope)
-                        processed_expr = _replace_variables_in_scope(processed_expr, new_scope)
                         
                         # Add prefix to variable name and add to scope
-                        prefixed_name = f'_xlpm.{var_name}'
+                        prefixed_name = _XLPM_PREFIX + var_name
                         new_scope[var_name] = prefixed_name
                         
                         # Add processed variable definition
@@ -251,11 +332,7 @@ def _process_lambda_let_unified(formula: str, scope: Optional[Dict[str, str]] =
                 
                 # Process final expression
                 if final_expr:
-                    # First process nested LAMBDA/LET functions
                     processed_final = _process_lambda_let_unified(final_expr, new_scope)
-                    # Then replace variables in the processed result
-                    # The processed_final might have introduced new LAMBDA/LET that need variable replacement
-                    processed_final = _replace_variables_in_scope(processed_final, new_scope)
                     processed_parts.append(processed_final)
                 
                 # Combine results
@@ -263,12 +340,32 @@ def _process_lambda_let_unified(formula: str, scope: Optional[Dict[str, str]] =
                 result.append(')')
                 i += end_pos + 1
                 
+        elif scope:
+            # Replace variable references as they are scanned
+            match = _WORD_RE.match(formula, i)
+            if match is None:
+                result.append(formula[i])
+                i += 1
+                continue
+            word = match.group()
+            prefixed_name = scope.get(word)
+            if (prefixed_name is None or word.isdigit()
+                    or formula[max(i - 6, 0):i] in (_XLPM_PREFIX, _XLOP_PREFIX)):
+                result.append(word)
+            else:
+                result.append(prefixed_name)
+            i = match.end()
+
         else:
             # Add regular character
             result.append(formula[i])
             i += 1
     
-    return ''.join(result)
+    processed = ''.join(result)
+    if scope:
+        # Variables whose names are not plain words are not seen by the scan
+        processed = _replace_variables_in_scope(processed, scope)
+    return processed
 
 
 def _is_function_at(formula: str, pos: int, func_name: str) -> bool:
@@ -472,7 +569,8 @@ def _replace_variables_in_scope(expr: str, scope: Dict[str, str]) -> str:
     for var_name, prefixed_name in scope.items():
         # Skip if variable name is a pure number (e.g., "2", "4")
         # This can happen with malformed variable names
-        if var_name.isdigit():
+        # Plain word names are already replaced while scanning
+        if var_name.isdigit() or _WORD_RE.fullmatch(var_name):
             continue
             
         # Use negative lookbehind to avoid replacing already prefixed variables
@@ -517,10 +615,11 @@ def _process_aggregate_function(formula: str, func_name: str, arg_index: int) ->
         Processed formula string
     """
     pattern = r'\b' + func_name + r'\s*\('
-    matches = list(re.finditer(pattern, formula, re.IGNORECASE))
     
-    # Process from back to front (to avoid position shifts)
-    for match in reversed(matches):
+    # Collect insertion points and build the result once at the end
+    insert_positions = []
+    
+    for match in re.finditer(pattern, formula, re.IGNORECASE):
         start_pos = match.end()
         
         # Parse arguments
@@ -530,9 +629,9 @@ def _process_aggregate_function(formula: str, func_name: str, arg_index: int) ->
             arg_content = args[arg_index].strip()
             
             # Add _xleta. if not LAMBDA (check both original and processed forms)
-            if not arg_content.upper().startswith('LAMBDA') and not arg_content.startswith('_xlfn.LAMBDA'):
+            if not arg_content.upper().startswith('LAMBDA') and not arg_content.startswith(_XLFN_PREFIX + 'LAMBDA'):
                 # Only add if prefix not already present
-                if not arg_content.startswith('_xleta.'):
+                if not arg_content.startswith(_XLETA_PREFIX):
                     # Find argument position
                     arg_start = start_pos
                     for i in range(arg_index):
@@ -542,10 +641,22 @@ def _process_aggregate_function(formula: str, func_name: str, arg_index: int) ->
                     while arg_start < len(formula) and formula[arg_start].isspace():
                         arg_start += 1
                     
-                    # Add prefix
-                    formula = formula[:arg_start] + '_xleta.' + formula[arg_start:]
+                    insert_positions.append(arg_start)
+    
+    if not insert_positions:
+        return formula
+    
+    # Add prefixes
+    parts = []
+    parts_append = parts.append
+    last = 0
+    for pos in sorted(insert_positions):
+        parts_append(formula[last:pos])
+        parts_append(_XLETA_PREFIX)
+        last = pos
+    parts_append(formula[last:])
     
-    return formula
+    return ''.join(parts)
 
 
 def _split_function_args(formula: str, start_pos: int) -> List[str]:
@@ -595,86 +706,82 @@ def _add_function_prefixes(formula: str) -> str:
     """
     Add prefixes to Excel 365 new function names
     
+    The formula is scanned once: only the identifiers in front of an opening
+    parenthesis are looked up in the new function list.
+    
     Args:
         formula: Formula string to process
     
     Returns:
         Formula with prefixes added
     """
-    # Mapping of new functions and their prefixes
-    function_map = _get_new_function_list()
+    # Skip functions which already have their prefix somewhere in the formula
+    skipped = ()
+    if _XLFN_PREFIX in formula:
+        skipped = {
+            func_name for func_name in _XLFN_FUNCTIONS
+            if _XLFN_PREFIX + func_name in formula
+        }
+        skipped.update(
+            func_name for func_name in _XLWS_FUNCTIONS
+            if _XLWS_PREFIX + func_name in formula
+        )
     
-    result = formula
-    
-    # Replace each function name
-    for func_name, prefix in function_map.items():
-        # Skip if already has the prefix for this specific function
-        if prefix + func_name in result:
-            continue
+    result = []
+    copied = 0
+    pos = formula.find('(')
+    
+    while pos != -1:
+        # Function names may be followed by spaces before '('
+        end = pos
+        while end > copied and formula[end - 1].isspace():
+            end -= 1
+        
+        # Find the start of the identifier
+        start = end
+        while start > copied and (formula[start - 1].isalnum() or formula[start - 1] == '_'):
+            start -= 1
         
-        # Use word boundaries to replace function names
-        # Exclude identifiers with _xlpm./_xlop./_xleta.
-        # Also exclude if already has _xlfn. prefix
-        pattern = r'(?<!_xlpm\.)(?<!_xlop\.)(?<!_xleta\.)(?<!_xlfn\.)\b' + func_name + r'(?=\s*\()'
-        replacement = prefix + func_name
-        result = re.sub(pattern, replacement, result, flags=re.IGNORECASE)
+        if start < end:
+            func_name = formula[start:end].upper()
+            if func_name in _XLWS_FUNCTIONS:
+                prefix = _XLWS_PREFIX
+            elif func_name in _XLFN_FUNCTIONS:
+                prefix = _XLFN_PREFIX
+            else:
+                prefix = None
+            
+            if (prefix and func_name not in skipped
+                and not _has_reserved_prefix(formula, start)):
+                result.append(formula[copied:start])
+                result.append(prefix + func_name)
+                copied = end
+        
+        pos = formula.find('(', pos + 1)
     
-    return result
+    if not copied:
+        return formula
+    
+    result.append(formula[copied:])
+    return ''.join(result)
 
 
-def _get_new_function_list() -> Dict[str, str]:
+def _has_reserved_prefix(formula: str, pos: int) -> bool:
     """
-    Return mapping of Excel 365 new functions and their prefixes
+    Check if the identifier at the specified position already has a prefix
+    
+    Identifiers with _xlpm./_xlop./_xleta. are parameters or aggregate
+    functions, and identifiers with _xlfn. are already converted.
+    
+    Args:
+        formula: Formula string
+        pos: Start position of the identifier
     
     Returns:
-        Dictionary of {function_name: prefix}
-    """
-    return {
-        # Regular new functions (add _xlfn.)
-        'UNIQUE': '_xlfn.',
-        'SORTBY': '_xlfn.',
-        'SEQUENCE': '_xlfn.',
-        'RANDARRAY': '_xlfn.',
-        'XLOOKUP': '_xlfn.',
-        'XMATCH': '_xlfn.',
-        'VSTACK': '_xlfn.',
-        'HSTACK': '_xlfn.',
-        'TAKE': '_xlfn.',
-        'DROP': '_xlfn.',
-        'CHOOSEROWS': '_xlfn.',
-        'CHOOSECOLS': '_xlfn.',
-        'EXPAND': '_xlfn.',
-        'TOCOL': '_xlfn.',
-        'TOROW': '_xlfn.',
-        'WRAPCOLS': '_xlfn.',
-        'WRAPROWS': '_xlfn.',
-        'ARRAYTOTEXT': '_xlfn.',
-        'VALUETOTEXT': '_xlfn.',
-        'TEXTAFTER': '_xlfn.',
-        'TEXTBEFORE': '_xlfn.',
-        'TEXTSPLIT': '_xlfn.',
-        'REGEXEXTRACT': '_xlfn.',
-        'REGEXREPLACE': '_xlfn.',
-        'REGEXTEST': '_xlfn.',
-        'ISOMITTED': '_xlfn.',
-        'MAP': '_xlfn.',
-        'REDUCE': '_xlfn.',
-        'SCAN': '_xlfn.',
-        'BYCOL': '_xlfn.',
-        'BYROW': '_xlfn.',
-        'MAKEARRAY': '_xlfn.',
-        'PERCENTOF': '_xlfn.',
-        'TRIMRANGE': '_xlfn.',
-        'LAMBDA': '_xlfn.',
-        'LET': '_xlfn.',
-        'GROUPBY': '_xlfn.',
-        'PIVOTBY': '_xlfn.',
-        'CONCAT': '_xlfn.',
-
-        # Special double prefix (add _xlfn._xlws.)
-        'SORT': '_xlfn._xlws.',
-        'FILTER': '_xlfn._xlws.',
-    }
+        True if the identifier is prefixed
+    """
+    preceding = formula[max(pos - 7, 0):pos].lower()
+    return preceding.endswith(_RESERVED_PREFIXES)
 
 
 def _convert_tro_notations(formula: str) -> str:
@@ -687,40 +794,21 @@ def _convert_tro_notations(formula: str) -> str:
     Returns:
         Converted formula string
     """
-    result = formula
-    
-    # Cell reference pattern - support cells, columns, rows
-    cell_pattern = r'(\$?[A-Z]+\$?\d+|\$?[A-Z]+|\$?\d+)'
-    sheet_pattern = r'([A-Za-z_][\w\.]*!)?'
-    
-    # .:. -> _xlfn._TRO_ALL
-    pattern_all = sheet_pattern + cell_pattern + r'\.:\.' + cell_pattern
-    result = re.sub(pattern_all, lambda m: _convert_tro_match(m, '_xlfn._TRO_ALL'), result)
-    
-    # :. -> _xlfn._TRO_TRAILING  
-    pattern_trailing = sheet_pattern + cell_pattern + r':\.' + cell_pattern
-    result = re.sub(pattern_trailing, lambda m: _convert_tro_match(m, '_xlfn._TRO_TRAILING'), result)
-    
-    # .: -> _xlfn._TRO_LEADING
-    pattern_leading = sheet_pattern + cell_pattern + r'\.:' + cell_pattern
-    result = re.sub(pattern_leading, lambda m: _convert_tro_match(m, '_xlfn._TRO_LEADING'), result)
-    
+    result = _TRO_ALL_RE.sub(lambda m: _convert_tro_match(m, '_xlfn._TRO_ALL'), formula)
+    result = _TRO_TRAILING_RE.sub(lambda m: _convert_tro_match(m, '_xlfn._TRO_TRAILING'), result)
+    result = _TRO_LEADING_RE.sub(lambda m: _convert_tro_match(m, '_xlfn._TRO_LEADING'), result)
     return result
 
 
 def _convert_spill_references(formula: str) -> str:
     """Convert spill suffix references (e.g. A1#) to ANCHORARRAY calls."""
 
-    pattern = re.compile(
-        r"(?P<sheet>(?:'[^']+'!|[A-Za-z_][\\w\.]*!)?)(?P<ref>\$?[A-Z]{1,3}\$?\d+|[A-Za-z_][\\w\.]*?)#"
-    )
-
     def repl(match: re.Match) -> str:
         sheet = match.group('sheet') or ''
         ref = match.group('ref')
         return f"_xlfn.ANCHORARRAY({sheet}{ref})"
 
-    return pattern.sub(repl, formula)
+    return _SPILL_REFERENCE_RE.sub(repl, formula)
 
 
 def _convert_tro_match(match: re.Match, func_name: str) -> str:
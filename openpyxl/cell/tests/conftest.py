@@ -0,0 +1,27 @@
+# Fixtures (pre-configured objects) for tests
+import pytest
+
+
+@pytest.fixture(scope="module")
+def workbook():
+    """Workbook shared by the tests of a module"""
+    from openpyxl import Workbook
+    return Workbook()
+
+
+@pytest.fixture
+def worksheet(workbook):
+    """Active worksheet of the shared workbook, emptied for each test"""
+    ws = workbook.active
+    ws._cells.clear()
+    return ws
+
+
+@pytest.fixture(params=['lxml', 'etree'])
+def write_cell_implementation(request):
+    """Each of the cell writers"""
+    from openpyxl.cell._writer import etree_write_cell, lxml_write_cell
+    if request.param == 'lxml':
+        return lxml_write_cell
+    else:
+        return etree_write_cell
@@ -66,7 +66,7 @@ def test_groupby_basic(worksheet, write_cell_implementation):
     for coord, formula, expected in test_cases:
         ws[coord] = formula
         cell = ws[coord]
-        cell._is_spill = True
+        cell.set_dynamic_array_formula()
         
         out = BytesIO()
         with xmlfile(out) as xf:
@@ -115,7 +115,7 @@ def test_pivotby_basic(worksheet, write_cell_implementation):
     for coord, formula, expected in test_cases:
         ws[coord] = formula
         cell = ws[coord]
-        cell._is_spill = True
+        cell.set_dynamic_array_formula()
         
         out = BytesIO()
         with xmlfile(out) as xf:
@@ -184,7 +184,7 @@ def test_complex_combinations(worksheet, write_cell_implementation):
     for coord, formula, expected in test_cases:
         ws[coord] = formula
         cell = ws[coord]
-        cell._is_spill = True
+        cell.set_dynamic_array_formula()
         
         out = BytesIO()
         with xmlfile(out) as xf:
@@ -219,7 +219,7 @@ def test_edge_cases(worksheet, write_cell_implementation):
     for coord, formula, expected in test_cases:
         ws[coord] = formula
         cell = ws[coord]
-        cell._is_spill = True
+        cell.set_dynamic_array_formula()
         
         out = BytesIO()
         with xmlfile(out) as xf:
@@ -5,62 +5,45 @@ Test special cell range notations (.:.、:.、.:) and their conversion to _TRO_*
 """
 
 import pytest
-from io import BytesIO
-from openpyxl.xml.functions import xmlfile
-from openpyxl.cell._writer import (
-    etree_write_cell,
-    lxml_write_cell
-)
 from openpyxl.cell.formula_utils import (
     prepare_spill_formula,
     _convert_tro_notations
 )
-from openpyxl.tests.helper import compare_xml
-
+from openpyxl.tests.helper import compare_xml, serialize_cell
 
-@pytest.fixture
-def worksheet():
-    from openpyxl import Workbook
-    wb = Workbook()
-    return wb.active
 
-
-@pytest.fixture(params=['lxml', 'etree'])
-def write_cell_implementation(request):
-    if request.param == 'lxml':
-        return lxml_write_cell
-    else:
-        return etree_write_cell
+_TRO_CASES = (
+    # Basic cell ranges
+    ("A1.:.B10", "_xlfn._TRO_ALL(A1:B10)"),
+    ("A1:.B10", "_xlfn._TRO_TRAILING(A1:B10)"),
+    ("A1.:B10", "_xlfn._TRO_LEADING(A1:B10)"),
+    # Column only
+    ("A.:.C", "_xlfn._TRO_ALL(A:C)"),
+    ("A:.C", "_xlfn._TRO_TRAILING(A:C)"),
+    ("A.:C", "_xlfn._TRO_LEADING(A:C)"),
+    # Row only
+    ("1.:.10", "_xlfn._TRO_ALL(1:10)"),
+    ("5:.20", "_xlfn._TRO_TRAILING(5:20)"),
+    ("100.:500", "_xlfn._TRO_LEADING(100:500)"),
+    # Absolute references
+    ("$A$1.:.$B$10", "_xlfn._TRO_ALL($A$1:$B$10)"),
+    ("$A.:.$C", "_xlfn._TRO_ALL($A:$C)"),
+    # Sheet references
+    ("Sheet1!A1.:.B10", "_xlfn._TRO_ALL(Sheet1!A1:Sheet1!B10)"),
+    ("Data!A:.C", "_xlfn._TRO_TRAILING(Data!A:Data!C)"),
+    # Normal colon (no conversion)
+    ("A1:B10", "A1:B10"),
+    ("Sheet1!A:C", "Sheet1!A:C"),
+    # Multiple notations
+    ("A1.:.B10+C1.:.D10", "_xlfn._TRO_ALL(A1:B10)+_xlfn._TRO_ALL(C1:D10)"),
+)
 
 
 class TestSpecialNotationConversion:
     """Test _convert_special_notation function"""
     
-    @pytest.mark.parametrize("formula,expected", [
-        # Basic cell ranges
-        ("A1.:.B10", "_xlfn._TRO_ALL(A1:B10)"),
-        ("A1:.B10", "_xlfn._TRO_TRAILING(A1:B10)"),
-        ("A1.:B10", "_xlfn._TRO_LEADING(A1:B10)"),
-        # Column only
-        ("A.:.C", "_xlfn._TRO_ALL(A:C)"),
-        ("A:.C", "_xlfn._TRO_TRAILING(A:C)"),
-        ("A.:C", "_xlfn._TRO_LEADING(A:C)"),
-        # Row only
-        ("1.:.10", "_xlfn._TRO_ALL(1:10)"),
-        ("5:.20", "_xlfn._TRO_TRAILING(5:20)"),
-        ("100.:500", "_xlfn._TRO_LEADING(100:500)"),
-        # Absolute references
-        ("$A$1.:.$B$10", "_xlfn._TRO_ALL($A$1:$B$10)"),
-        ("$A.:.$C", "_xlfn._TRO_ALL($A:$C)"),
-        # Sheet references
-        ("Sheet1!A1.:.B10", "_xlfn._TRO_ALL(Sheet1!A1:Sheet1!B10)"),
-        ("Data!A:.C", "_xlfn._TRO_TRAILING(Data!A:Data!C)"),
-        # Normal colon (no conversion)
-        ("A1:B10", "A1:B10"),
-        ("Sheet1!A:C", "Sheet1!A:C"),
-        # Multiple notations
-        ("A1.:.B10+C1.:.D10", "_xlfn._TRO_ALL(A1:B10)+_xlfn._TRO_ALL(C1:D10)"),
-    ])
+    @pytest.mark.parametrize("formula,expected", _TRO_CASES,
+                             ids=[case[0] for case in _TRO_CASES])
     def test_convert_special_notation(self, formula, expected):
         assert _convert_tro_notations(formula) == expected
     
@@ -99,6 +82,17 @@ class TestAddFunctionPrefix:
         # LAMBDA with special notation
         ("=LAMBDA(x,SUM(x))(A1.:.B10)",
          "=_xlfn.LAMBDA(_xlpm.x,SUM(_xlpm.x))(_xlfn._TRO_ALL(A1:B10))"),
+        # String literals are left untouched
+        ('=SORT(A1:A3)&"SORT("', '=_xlfn._xlws.SORT(A1:A3)&"SORT("'),
+        ('=UNIQUE(A1:A3)&"a""b"', '=_xlfn.UNIQUE(A1:A3)&"a""b"'),
+        ('=UNIQUE(A1:A3)&"say ""SORT("""', '=_xlfn.UNIQUE(A1:A3)&"say ""SORT("""'),
+        ('=FILTER(A1:A3,B1:B3<>"")', '=_xlfn._xlws.FILTER(A1:A3,B1:B3<>"")'),
+        ('=""&UNIQUE(A1:A3)&""""', '=""&_xlfn.UNIQUE(A1:A3)&""""'),
+        # Unterminated string
+        ('=UNIQUE(A1:A3)&"abc', '=_xlfn.UNIQUE(A1:A3)&"abc'),
+        # Text that looks like a placeholder
+        ('=LET(x,"__STR_1__",x&"y")', '=_xlfn.LET(_xlpm.x,"__STR_1__",_xlpm.x&"y")'),
+        ('=FILTER(__STR_0__,A1:A3<>"")', '=_xlfn._xlws.FILTER(__STR_0__,A1:A3<>"")'),
     ])
     def test_add_function_prefix(self, formula, expected):
         class MockCell:
@@ -107,134 +101,125 @@ class TestAddFunctionPrefix:
         assert result == expected
 
 
-def test_special_notation_basic(worksheet, write_cell_implementation):
-    """Test basic special notation conversion in cell writing"""
-    write_cell = write_cell_implementation
-    ws = worksheet
-    
-    test_cases = [
-        # .:. notation (all)
-        ("A1", '=J5.:.L10', """
+_BASIC_CASES = [
+    # .:. notation (all)
+    ("A1", '=J5.:.L10', """
     <c r="A1">
       <f>_xlfn._TRO_ALL(J5:L10)</f>
       <v/>
     </c>"""),
-        
-        # :. notation (trailing)
-        ("A2", '=J5:.L10', """
+    
+    # :. notation (trailing)
+    ("A2", '=J5:.L10', """
     <c r="A2">
       <f>_xlfn._TRO_TRAILING(J5:L10)</f>
       <v/>
     </c>"""),
-        
-        # .: notation (leading)
-        ("A3", '=J5.:L10', """
+    
+    # .: notation (leading)
+    ("A3", '=J5.:L10', """
     <c r="A3">
       <f>_xlfn._TRO_LEADING(J5:L10)</f>
       <v/>
     </c>"""),
-    ]
-    
-    for cell_ref, formula, expected in test_cases:
-        cell = ws[cell_ref]
-        cell.value = formula
-        
-        out = BytesIO()
-        with xmlfile(out) as xf:
-            write_cell(xf, ws, cell)
-        
-        xml = out.getvalue()
-        diff = compare_xml(xml, expected)
-        assert diff is None, f"Failed for {formula}: {diff}"
+]
 
 
-def test_special_notation_column_row(worksheet, write_cell_implementation):
-    """Test column and row only special notations"""
-    write_cell = write_cell_implementation
-    ws = worksheet
-    
-    test_cases = [
-        # Column notation
-        ("B1", '=P.:.Q', """
+_COLUMN_ROW_CASES = [
+    # Column notation
+    ("B1", '=P.:.Q', """
     <c r="B1">
       <f>_xlfn._TRO_ALL(P:Q)</f>
       <v/>
     </c>"""),
-        
-        # Row notation
-        ("B2", '=11.:.11', """
+    
+    # Row notation
+    ("B2", '=11.:.11', """
     <c r="B2">
       <f>_xlfn._TRO_ALL(11:11)</f>
       <v/>
     </c>"""),
-        
-        # In SUM function
-        ("B3", '=SUM(P:.Q)', """
+    
+    # In SUM function
+    ("B3", '=SUM(P:.Q)', """
     <c r="B3">
       <f>SUM(_xlfn._TRO_TRAILING(P:Q))</f>
       <v/>
     </c>"""),
-    ]
-    
-    for cell_ref, formula, expected in test_cases:
-        cell = ws[cell_ref]
-        cell.value = formula
-        
-        out = BytesIO()
-        with xmlfile(out) as xf:
-            write_cell(xf, ws, cell)
-        
-        xml = out.getvalue()
-        diff = compare_xml(xml, expected)
-        assert diff is None, f"Failed for {formula}: {diff}"
+]
 
 
-def test_special_notation_complex(worksheet, write_cell_implementation):
-    """Test complex formulas with special notations"""
-    write_cell = write_cell_implementation
-    ws = worksheet
-    
-    test_cases = [
-        # SORT with special notation
-        ("C1", '=SORT(J22.:.L26)', """
+_COMPLEX_CASES = [
+    # SORT with special notation
+    ("C1", '=SORT(J22.:.L26)', """
     <c r="C1">
       <f>_xlfn._xlws.SORT(_xlfn._TRO_ALL(J22:L26))</f>
       <v/>
     </c>"""),
-        
-        # UNIQUE with special notation
-        ("C2", '=UNIQUE(J5:.L10)', """
+    
+    # UNIQUE with special notation
+    ("C2", '=UNIQUE(J5:.L10)', """
     <c r="C2">
       <f>_xlfn.UNIQUE(_xlfn._TRO_TRAILING(J5:L10))</f>
       <v/>
     </c>"""),
-        
-        # VLOOKUP with special notation
-        ("C3", '=VLOOKUP(70,J5.:L10,3,FALSE)', """
+    
+    # VLOOKUP with special notation
+    ("C3", '=VLOOKUP(70,J5.:L10,3,FALSE)', """
     <c r="C3">
       <f>VLOOKUP(70,_xlfn._TRO_LEADING(J5:L10),3,FALSE)</f>
       <v/>
     </c>"""),
-        
-        # Multiple special notations
-        ("C4", '=J5.:.J10*N5.:.N10', """
+    
+    # Multiple special notations
+    ("C4", '=J5.:.J10*N5.:.N10', """
     <c r="C4">
       <f>_xlfn._TRO_ALL(J5:J10)*_xlfn._TRO_ALL(N5:N10)</f>
       <v/>
     </c>"""),
-    ]
-    
-    for cell_ref, formula, expected in test_cases:
-        cell = ws[cell_ref]
-        cell.value = formula
-        
-        out = BytesIO()
-        with xmlfile(out) as xf:
-            write_cell(xf, ws, cell)
-        
-        xml = out.getvalue()
-        diff = compare_xml(xml, expected)
-        assert diff is None, f"Failed for {formula}: {diff}"
+]
+
+
+@pytest.mark.parametrize("cell_ref, formula, expected", _BASIC_CASES)
+def test_special_notation_basic(worksheet, write_cell_implementation, cell_ref, formula, expected):
+    """Test basic special notation conversion in cell writing"""
+    write_cell = write_cell_implementation
+    ws = worksheet
+
+    cell = ws[cell_ref]
+    cell.value = formula
+
+    xml = serialize_cell(write_cell, ws, cell)
+    diff = compare_xml(xml, expected)
+    assert diff is None, f"Failed for {formula}: {diff}"
+
+
+@pytest.mark.parametrize("cell_ref, formula, expected", _COLUMN_ROW_CASES)
+def test_special_notation_column_row(worksheet, write_cell_implementation, cell_ref, formula, expected):
+    """Test column and row only special notations"""
+    write_cell = write_cell_implementation
+    ws = worksheet
+
+    cell = ws[cell_ref]
+    cell.value = formula
+
+    xml = serialize_cell(write_cell, ws, cell)
+    diff = compare_xml(xml, expected)
+    assert diff is None, f"Failed for {formula}: {diff}"
+
+
+@pytest.mark.parametrize("cell_ref, formula, expected", _COMPLEX_CASES)
+def test_special_notation_complex(worksheet, write_cell_implementation, cell_ref, formula, expected):
+    """Test complex formulas with special notations"""
+    write_cell = write_cell_implementation
+    ws = worksheet
+
+    cell = ws[cell_ref]
+    cell.value = formula
+
+    xml = serialize_cell(write_cell, ws, cell)
+    diff = compare_xml(xml, expected)
+    assert diff is None, f"Failed for {formula}: {diff}"
 
 
 def test_special_notation_with_lambda(worksheet, write_cell_implementation):
@@ -246,9 +231,7 @@ def test_special_notation_with_lambda(worksheet, write_cell_implementation):
     cell = ws["D1"]
     cell.value = '=LAMBDA(range,SUM(range))(A1.:.B10)'
     
-    out = BytesIO()
-    with xmlfile(out) as xf:
-        write_cell(xf, ws, cell)
+    xml = serialize_cell(write_cell, ws, cell)
     
     expected = """
     <c r="D1">
@@ -256,7 +239,6 @@ def test_special_notation_with_lambda(worksheet, write_cell_implementation):
       <v/>
     </c>"""
     
-    xml = out.getvalue()
     diff = compare_xml(xml, expected)
     assert diff is None, diff
 
@@ -270,9 +252,7 @@ def test_special_notation_let_function(worksheet, write_cell_implementation):
     cell = ws["E1"]
     cell.value = '=LET(data,A1.:.B10,total,SUM(data),total*2)'
     
-    out = BytesIO()
-    with xmlfile(out) as xf:
-        write_cell(xf, ws, cell)
+    xml = serialize_cell(write_cell, ws, cell)
     
     expected = """
     <c r="E1">
@@ -280,6 +260,5 @@ def test_special_notation_let_function(worksheet, write_cell_implementation):
       <v/>
     </c>"""
     
-    xml = out.getvalue()
     diff = compare_xml(xml, expected)
     assert diff is None, diff
\ No newline at end of file
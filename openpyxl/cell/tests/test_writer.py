@@ -8,7 +8,7 @@ import pytest
 
 from openpyxl.xml.functions import xmlfile
 
-from openpyxl.tests.helper import compare_xml
+from openpyxl.tests.helper import compare_xml, expected_cell_xml, serialize_cell
 from openpyxl.utils.datetime import CALENDAR_MAC_1904, CALENDAR_WINDOWS_1900
 
 from openpyxl import LXML
@@ -292,8 +292,7 @@ def test_nested_spill_formulas(worksheet, write_cell_implementation):
     # Test 1: SORT(UNIQUE(...))
     cell = ws["F2"]
     cell.value = '=SORT(UNIQUE(B2:B8),1,-1)'
-    cell._is_spill = True
-    cell._spill_range = 'F2:F6'
+    cell.set_dynamic_array_formula('F2:F6')
     
     out = BytesIO()
     with xmlfile(out) as xf:
@@ -317,8 +316,7 @@ def test_deeply_nested_spill_formulas(worksheet, write_cell_implementation):
     # Test: FILTER(SORT(...),condition)
     cell = ws["F8"]
     cell.value = '=FILTER(SORT(B2:B8,1,-1),SORT(B2:B8,1,-1)>=2000)'
-    cell._is_spill = True
-    cell._spill_range = 'F8:F12'
+    cell.set_dynamic_array_formula('F8:F12')
     
     out = BytesIO()
     with xmlfile(out) as xf:
@@ -359,434 +357,252 @@ def test_mixed_spill_formulas(worksheet, write_cell_implementation):
     assert diff is None, diff
 
 
-def test_phase1_array_functions(worksheet, write_cell_implementation):
+_FORMULA_CELL = '<c r="{ref}"><f>{body}</f><v/></c>'
+_SPILL_CELL = '<c r="{ref}" cm="1"><f t="array" ref="{spill}">{body}</f><v>0</v></c>'
+
+
+# テストケース: (セル, 数式, スピル範囲, 期待される数式)
+_PHASE1_CASES = expected_cell_xml([
+    # VSTACK
+    ("A1", '=VSTACK(A2:B3,A5:B6)', 'A1:B4', '_xlfn.VSTACK(A2:B3,A5:B6)'),
+    
+    # HSTACK
+    ("B1", '=HSTACK(A1:A3,B1:B3)', 'B1:C3', '_xlfn.HSTACK(A1:A3,B1:B3)'),
+    
+    # TAKE
+    ("C1", '=TAKE(A1:C5,3)', 'C1:E3', '_xlfn.TAKE(A1:C5,3)'),
+    
+    # DROP
+    ("D1", '=DROP(A1:C5,1)', 'D1:F4', '_xlfn.DROP(A1:C5,1)'),
+    
+    # CHOOSEROWS
+    ("E1", '=CHOOSEROWS(A1:C5,1,3)', 'E1:G2', '_xlfn.CHOOSEROWS(A1:C5,1,3)'),
+    
+    # CHOOSECOLS
+    ("F1", '=CHOOSECOLS(A1:C5,1,3)', 'F1:G5', '_xlfn.CHOOSECOLS(A1:C5,1,3)'),
+    
+    # EXPAND
+    ("G1", '=EXPAND(A1:B3,5,4,"N/A")', 'G1:J5', '_xlfn.EXPAND(A1:B3,5,4,"N/A")'),
+    
+    # TOCOL
+    ("H1", '=TOCOL(A1:C3)', 'H1:H9', '_xlfn.TOCOL(A1:C3)'),
+    
+    # TOROW
+    ("I1", '=TOROW(A1:B4)', 'I1:P1', '_xlfn.TOROW(A1:B4)'),
+    
+    # WRAPCOLS
+    ("J1", '=WRAPCOLS(SEQUENCE(10),3)', 'J1:L4', '_xlfn.WRAPCOLS(_xlfn.SEQUENCE(10),3)'),
+    
+    # WRAPROWS
+    ("K1", '=WRAPROWS(SEQUENCE(10),3)', 'K1:N3', '_xlfn.WRAPROWS(_xlfn.SEQUENCE(10),3)'),
+], _FORMULA_CELL, _SPILL_CELL)
+
+
+@pytest.mark.parametrize("cell_ref, formula, spill_range, expected", _PHASE1_CASES)
+def test_phase1_array_functions(worksheet, write_cell_implementation,
+        cell_ref, formula, spill_range, expected):
     """Test Phase 1 array manipulation functions with proper _xlfn prefix"""
     write_cell = write_cell_implementation
     ws = worksheet
+
+    cell = ws[cell_ref]
+    cell.value = formula
+    cell.set_dynamic_array_formula(spill_range)
     
-    # テストケース: (セル, 数式, スピル範囲, 期待されるXML)
-    test_cases = [
-        # VSTACK
-        ("A1", '=VSTACK(A2:B3,A5:B6)', 'A1:B4', """
-    <c r="A1" cm="1">
-      <f t="array" ref="A1:B4">_xlfn.VSTACK(A2:B3,A5:B6)</f>
-      <v>0</v>
-    </c>"""),
-        
-        # HSTACK
-        ("B1", '=HSTACK(A1:A3,B1:B3)', 'B1:C3', """
-    <c r="B1" cm="1">
-      <f t="array" ref="B1:C3">_xlfn.HSTACK(A1:A3,B1:B3)</f>
-      <v>0</v>
-    </c>"""),
-        
-        # TAKE
-        ("C1", '=TAKE(A1:C5,3)', 'C1:E3', """
-    <c r="C1" cm="1">
-      <f t="array" ref="C1:E3">_xlfn.TAKE(A1:C5,3)</f>
-      <v>0</v>
-    </c>"""),
-        
-        # DROP
-        ("D1", '=DROP(A1:C5,1)', 'D1:F4', """
-    <c r="D1" cm="1">
-      <f t="array" ref="D1:F4">_xlfn.DROP(A1:C5,1)</f>
-      <v>0</v>
-    </c>"""),
-        
-        # CHOOSEROWS
-        ("E1", '=CHOOSEROWS(A1:C5,1,3)', 'E1:G2', """
-    <c r="E1" cm="1">
-      <f t="array" ref="E1:G2">_xlfn.CHOOSEROWS(A1:C5,1,3)</f>
-      <v>0</v>
-    </c>"""),
-        
-        # CHOOSECOLS
-        ("F1", '=CHOOSECOLS(A1:C5,1,3)', 'F1:G5', """
-    <c r="F1" cm="1">
-      <f t="array" ref="F1:G5">_xlfn.CHOOSECOLS(A1:C5,1,3)</f>
-      <v>0</v>
-    </c>"""),
-        
-        # EXPAND
-        ("G1", '=EXPAND(A1:B3,5,4,"N/A")', 'G1:J5', """
-    <c r="G1" cm="1">
-      <f t="array" ref="G1:J5">_xlfn.EXPAND(A1:B3,5,4,"N/A")</f>
-      <v>0</v>
-    </c>"""),
-        
-        # TOCOL
-        ("H1", '=TOCOL(A1:C3)', 'H1:H9', """
-    <c r="H1" cm="1">
-      <f t="array" ref="H1:H9">_xlfn.TOCOL(A1:C3)</f>
-      <v>0</v>
-    </c>"""),
-        
-        # TOROW
-        ("I1", '=TOROW(A1:B4)', 'I1:P1', """
-    <c r="I1" cm="1">
-      <f t="array" ref="I1:P1">_xlfn.TOROW(A1:B4)</f>
-      <v>0</v>
-    </c>"""),
-        
-        # WRAPCOLS
-        ("J1", '=WRAPCOLS(SEQUENCE(10),3)', 'J1:L4', """
-    <c r="J1" cm="1">
-      <f t="array" ref="J1:L4">_xlfn.WRAPCOLS(_xlfn.SEQUENCE(10),3)</f>
-      <v>0</v>
-    </c>"""),
-        
-        # WRAPROWS
-        ("K1", '=WRAPROWS(SEQUENCE(10),3)', 'K1:N3', """
-    <c r="K1" cm="1">
-      <f t="array" ref="K1:N3">_xlfn.WRAPROWS(_xlfn.SEQUENCE(10),3)</f>
-      <v>0</v>
-    </c>"""),
-    ]
-    
-    # 各テストケースを実行
-    for cell_ref, formula, spill_range, expected in test_cases:
-        cell = ws[cell_ref]
-        cell.value = formula
-        cell._is_spill = True
-        cell._spill_range = spill_range
-        
-        out = BytesIO()
-        with xmlfile(out) as xf:
-            write_cell(xf, ws, cell)
-        
-        xml = out.getvalue()
-        diff = compare_xml(xml, expected)
-        assert diff is None, f"Failed for {formula}: {diff}"
+    xml = serialize_cell(write_cell, ws, cell)
+    diff = compare_xml(xml, expected)
+    assert diff is None, f"Failed for {formula}: {diff}"
 
 
-def test_phase2_text_functions(worksheet, write_cell_implementation):
+# テストケース: (セル, 数式, スピル範囲, 期待される数式)
+_PHASE2_CASES = expected_cell_xml([
+    # ARRAYTOTEXT
+    ("A1", '=ARRAYTOTEXT(A2:B6)', 'A1', '_xlfn.ARRAYTOTEXT(A2:B6)'),
+    
+    # VALUETOTEXT
+    ("B1", '=VALUETOTEXT(D2)', 'B1', '_xlfn.VALUETOTEXT(D2)'),
+    
+    # TEXTAFTER
+    ("C1", '=TEXTAFTER(B2:B6,"@")', 'C1:C5', '_xlfn.TEXTAFTER(B2:B6,"@")'),
+    
+    # TEXTBEFORE
+    ("D1", '=TEXTBEFORE(B2:B6,"@")', 'D1:D5', '_xlfn.TEXTBEFORE(B2:B6,"@")'),
+    
+    # TEXTSPLIT
+    ("E1", '=TEXTSPLIT(C2,"-")', 'E1:G1', '_xlfn.TEXTSPLIT(C2,"-")'),
+    
+    # REGEXEXTRACT
+    ("F1", r'=REGEXEXTRACT(C2:C6,"\d+")', 'F1:F5', r'_xlfn.REGEXEXTRACT(C2:C6,"\d+")'),
+    
+    # REGEXREPLACE
+    ("G1", '=REGEXREPLACE(B2:B6,"@.*","@company.com")', 'G1:G5', '_xlfn.REGEXREPLACE(B2:B6,"@.*","@company.com")'),
+    
+    # REGEXTEST
+    ("H1", r'=REGEXTEST(B2:B6,"\.com$")', 'H1:H5', r'_xlfn.REGEXTEST(B2:B6,"\.com$")'),
+], _FORMULA_CELL, _SPILL_CELL)
+
+
+@pytest.mark.parametrize("cell_ref, formula, spill_range, expected", _PHASE2_CASES)
+def test_phase2_text_functions(worksheet, write_cell_implementation,
+        cell_ref, formula, spill_range, expected):
     """Test Phase 2 text processing functions with proper _xlfn prefix"""
     write_cell = write_cell_implementation
     ws = worksheet
+
+    cell = ws[cell_ref]
+    cell.value = formula
+    cell.set_dynamic_array_formula(spill_range)
     
-    # テストケース: (セル, 数式, スピル範囲, 期待されるXML)
-    test_cases = [
-        # ARRAYTOTEXT
-        ("A1", '=ARRAYTOTEXT(A2:B6)', 'A1', """
-    <c r="A1" cm="1">
-      <f t="array" ref="A1">_xlfn.ARRAYTOTEXT(A2:B6)</f>
-      <v>0</v>
-    </c>"""),
-        
-        # VALUETOTEXT
-        ("B1", '=VALUETOTEXT(D2)', 'B1', """
-    <c r="B1" cm="1">
-      <f t="array" ref="B1">_xlfn.VALUETOTEXT(D2)</f>
-      <v>0</v>
-    </c>"""),
-        
-        # TEXTAFTER
-        ("C1", '=TEXTAFTER(B2:B6,"@")', 'C1:C5', """
-    <c r="C1" cm="1">
-      <f t="array" ref="C1:C5">_xlfn.TEXTAFTER(B2:B6,"@")</f>
-      <v>0</v>
-    </c>"""),
-        
-        # TEXTBEFORE
-        ("D1", '=TEXTBEFORE(B2:B6,"@")', 'D1:D5', """
-    <c r="D1" cm="1">
-      <f t="array" ref="D1:D5">_xlfn.TEXTBEFORE(B2:B6,"@")</f>
-      <v>0</v>
-    </c>"""),
-        
-        # TEXTSPLIT
-        ("E1", '=TEXTSPLIT(C2,"-")', 'E1:G1', """
-    <c r="E1" cm="1">
-      <f t="array" ref="E1:G1">_xlfn.TEXTSPLIT(C2,"-")</f>
-      <v>0</v>
-    </c>"""),
-        
-        # REGEXEXTRACT
-        ("F1", '=REGEXEXTRACT(C2:C6,"\d+")', 'F1:F5', """
-    <c r="F1" cm="1">
-      <f t="array" ref="F1:F5">_xlfn.REGEXEXTRACT(C2:C6,"\d+")</f>
-      <v>0</v>
-    </c>"""),
-        
-        # REGEXREPLACE
-        ("G1", '=REGEXREPLACE(B2:B6,"@.*","@company.com")', 'G1:G5', """
-    <c r="G1" cm="1">
-      <f t="array" ref="G1:G5">_xlfn.REGEXREPLACE(B2:B6,"@.*","@company.com")</f>
-      <v>0</v>
-    </c>"""),
-        
-        # REGEXTEST
-        ("H1", '=REGEXTEST(B2:B6,"\.com$")', 'H1:H5', """
-    <c r="H1" cm="1">
-      <f t="array" ref="H1:H5">_xlfn.REGEXTEST(B2:B6,"\.com$")</f>
-      <v>0</v>
-    </c>"""),
-    ]
-    
-    # 各テストケースを実行
-    for cell_ref, formula, spill_range, expected in test_cases:
-        cell = ws[cell_ref]
-        cell.value = formula
-        cell._is_spill = True
-        cell._spill_range = spill_range
-        
-        out = BytesIO()
-        with xmlfile(out) as xf:
-            write_cell(xf, ws, cell)
-        
-        xml = out.getvalue()
-        diff = compare_xml(xml, expected)
-        assert diff is None, f"Failed for {formula}: {diff}"
+    xml = serialize_cell(write_cell, ws, cell)
+    diff = compare_xml(xml, expected)
+    assert diff is None, f"Failed for {formula}: {diff}"
+
+
+# テストケース: (セル, 数式, 期待される数式) - スピルなし
+_NEW_FUNCTION_CASES = expected_cell_xml([
+    # Phase 1 functions
+    ("A1", '=VSTACK(A2:A3,B2:B3)', '_xlfn.VSTACK(A2:A3,B2:B3)'),
+    
+    ("B1", '=HSTACK(A1,B1)', '_xlfn.HSTACK(A1,B1)'),
+    
+    ("C1", '=TAKE(A1:C5,1)', '_xlfn.TAKE(A1:C5,1)'),
+    
+    # Phase 2 functions
+    ("D1", '=ARRAYTOTEXT(A1:B2)', '_xlfn.ARRAYTOTEXT(A1:B2)'),
+    
+    ("E1", '=TEXTBEFORE(A1,"@")', '_xlfn.TEXTBEFORE(A1,"@")'),
+    
+    ("F1", '=REGEXTEST(A1,"test")', '_xlfn.REGEXTEST(A1,"test")'),
+    
+    # 既存のスピル関数
+    ("G1", '=UNIQUE(B1:B10)', '_xlfn.UNIQUE(B1:B10)'),
+    
+    ("H1", '=SORT(A1:A10)', '_xlfn._xlws.SORT(A1:A10)'),
+], _FORMULA_CELL, _SPILL_CELL)
 
 
-def test_new_functions_without_spill_array(worksheet, write_cell_implementation):
+@pytest.mark.parametrize("cell_ref, formula, expected", _NEW_FUNCTION_CASES)
+def test_new_functions_without_spill_array(worksheet, write_cell_implementation,
+        cell_ref, formula, expected):
     """Test new functions in normal formulas (not spilling) also get _xlfn prefix"""
     write_cell = write_cell_implementation
     ws = worksheet
+
+    cell = ws[cell_ref]
+    cell.value = formula
+    # _is_spillは設定しない（通常の数式）
     
-    # テストケース: (セル, 数式, 期待されるXML) - スピルなし
-    test_cases = [
-        # Phase 1 functions
-        ("A1", '=VSTACK(A2:A3,B2:B3)', """
-    <c r="A1">
-      <f>_xlfn.VSTACK(A2:A3,B2:B3)</f>
-      <v/>
-    </c>"""),
-        
-        ("B1", '=HSTACK(A1,B1)', """
-    <c r="B1">
-      <f>_xlfn.HSTACK(A1,B1)</f>
-      <v/>
-    </c>"""),
-        
-        ("C1", '=TAKE(A1:C5,1)', """
-    <c r="C1">
-      <f>_xlfn.TAKE(A1:C5,1)</f>
-      <v/>
-    </c>"""),
-        
-        # Phase 2 functions
-        ("D1", '=ARRAYTOTEXT(A1:B2)', """
-    <c r="D1">
-      <f>_xlfn.ARRAYTOTEXT(A1:B2)</f>
-      <v/>
-    </c>"""),
-        
-        ("E1", '=TEXTBEFORE(A1,"@")', """
-    <c r="E1">
-      <f>_xlfn.TEXTBEFORE(A1,"@")</f>
-      <v/>
-    </c>"""),
-        
-        ("F1", '=REGEXTEST(A1,"test")', """
-    <c r="F1">
-      <f>_xlfn.REGEXTEST(A1,"test")</f>
-      <v/>
-    </c>"""),
-        
-        # 既存のスピル関数
-        ("G1", '=UNIQUE(B1:B10)', """
-    <c r="G1">
-      <f>_xlfn.UNIQUE(B1:B10)</f>
-      <v/>
-    </c>"""),
-        
-        ("H1", '=SORT(A1:A10)', """
-    <c r="H1">
-      <f>_xlfn._xlws.SORT(A1:A10)</f>
-      <v/>
-    </c>"""),
-    ]
-    
-    # 各テストケースを実行
-    for cell_ref, formula, expected in test_cases:
-        cell = ws[cell_ref]
-        cell.value = formula
-        # _is_spillは設定しない（通常の数式）
-        
-        out = BytesIO()
-        with xmlfile(out) as xf:
-            write_cell(xf, ws, cell)
-        
-        xml = out.getvalue()
-        diff = compare_xml(xml, expected)
-        assert diff is None, f"Failed for {formula}: {diff}"
+    xml = serialize_cell(write_cell, ws, cell)
+    diff = compare_xml(xml, expected)
+    assert diff is None, f"Failed for {formula}: {diff}"
+
 
-def test_phase3_normal_array_spill(worksheet, write_cell_implementation):
+# Test cases for normal array operations
+_PHASE3_ARRAY_SPILL_CASES = expected_cell_xml([
+    # 基本的な配列演算
+    ("C2", '=A2:A6+B2:B6', 'C2:C6', 'A2:A6+B2:B6'),
+    
+    # 配列の減算
+    ("D2", '=B2:B6-A2:A6', 'D2:D6', 'B2:B6-A2:A6'),
+    
+    # 配列の乗算
+    ("E2", '=A2:A6*2', 'E2:E6', 'A2:A6*2'),
+    
+    # IF関数での配列処理
+    ("F2", '=IF(A2:A6>3,B2:B6,10)', 'F2:F6', 'IF(A2:A6>3,B2:B6,10)'),
+    
+    # 配列同士の比較
+    ("G2", '=IF(A2:A6=B2:B6/10,"一致","不一致")', 'G2:G6', 'IF(A2:A6=B2:B6/10,"一致","不一致")'),
+    
+    # 複数列の配列演算
+    ("H2", '=A2:B6*2', 'H2:I6', 'A2:B6*2'),
+    
+    # 既存関数での配列処理
+    ("L2", '=UPPER(K2:K6)', 'L2:L6', 'UPPER(K2:K6)'),
+], _FORMULA_CELL, _SPILL_CELL)
+
+
+@pytest.mark.parametrize("cell_ref, formula, spill_range, expected", _PHASE3_ARRAY_SPILL_CASES)
+def test_phase3_normal_array_spill(worksheet, write_cell_implementation,
+        cell_ref, formula, spill_range, expected):
     """Test Phase 3: Normal array formulas that spill
     
     Tests regular formulas like A1:A5+B1:B5 that produce array results
     """
     write_cell = write_cell_implementation
     ws = worksheet
+
+    cell = ws[cell_ref]
+    cell.value = formula
+    cell.set_dynamic_array_formula(spill_range)
     
-    # Test cases for normal array operations
-    test_cases = [
-        # 基本的な配列演算
-        ("C2", '=A2:A6+B2:B6', 'C2:C6', """
-    <c r="C2" cm="1">
-      <f t="array" ref="C2:C6">A2:A6+B2:B6</f>
-      <v>0</v>
-    </c>"""),
-        
-        # 配列の減算
-        ("D2", '=B2:B6-A2:A6', 'D2:D6', """
-    <c r="D2" cm="1">
-      <f t="array" ref="D2:D6">B2:B6-A2:A6</f>
-      <v>0</v>
-    </c>"""),
-        
-        # 配列の乗算
-        ("E2", '=A2:A6*2', 'E2:E6', """
-    <c r="E2" cm="1">
-      <f t="array" ref="E2:E6">A2:A6*2</f>
-      <v>0</v>
-    </c>"""),
-        
-        # IF関数での配列処理
-        ("F2", '=IF(A2:A6>3,B2:B6,10)', 'F2:F6', """
-    <c r="F2" cm="1">
-      <f t="array" ref="F2:F6">IF(A2:A6&gt;3,B2:B6,10)</f>
-      <v>0</v>
-    </c>"""),
-        
-        # 配列同士の比較
-        ("G2", '=IF(A2:A6=B2:B6/10,"一致","不一致")', 'G2:G6', """
-    <c r="G2" cm="1">
-      <f t="array" ref="G2:G6">IF(A2:A6=B2:B6/10,"一致","不一致")</f>
-      <v>0</v>
-    </c>"""),
-        
-        # 複数列の配列演算
-        ("H2", '=A2:B6*2', 'H2:I6', """
-    <c r="H2" cm="1">
-      <f t="array" ref="H2:I6">A2:B6*2</f>
-      <v>0</v>
-    </c>"""),
-        
-        # 既存関数での配列処理
-        ("L2", '=UPPER(K2:K6)', 'L2:L6', """
-    <c r="L2" cm="1">
-      <f t="array" ref="L2:L6">UPPER(K2:K6)</f>
-      <v>0</v>
-    </c>"""),
-    ]
-    
-    # 各テストケースを実行
-    for cell_ref, formula, spill_range, expected in test_cases:
-        cell = ws[cell_ref]
-        cell.value = formula
-        cell._is_spill = True
-        cell._spill_range = spill_range
-        
-        out = BytesIO()
-        with xmlfile(out) as xf:
-            write_cell(xf, ws, cell)
-        
-        xml = out.getvalue()
-        diff = compare_xml(xml, expected)
-        assert diff is None, f"Failed for {formula}: {diff}"
+    xml = serialize_cell(write_cell, ws, cell)
+    diff = compare_xml(xml, expected)
+    assert diff is None, f"Failed for {formula}: {diff}"
+
+
+# Test cases combining normal operations with spill functions
+_PHASE3_NEW_FUNCTION_SPILL_CASES = expected_cell_xml([
+    # スピル関数を含む通常の配列演算
+    ("M2", '=UNIQUE(A2:A11)*2', 'M2:M11', '_xlfn.UNIQUE(A2:A11)*2'),
+    
+    # 通常の配列演算をスピル関数に渡す
+    ("N2", '=SORT(A2:A6*B2:B6)', 'N2:N6', '_xlfn._xlws.SORT(A2:A6*B2:B6)'),
+    
+    # IF関数とスピル関数の組み合わせ
+    ("O2", '=IF(UNIQUE(A2:A6)>2,UNIQUE(B2:B6),0)', 'O2:O6', 'IF(_xlfn.UNIQUE(A2:A6)>2,_xlfn.UNIQUE(B2:B6),0)'),
+    
+    # FILTER関数と通常の配列演算
+    ("P2", '=FILTER(A2:A10*2,A2:A10>5)', 'P2:P6', '_xlfn._xlws.FILTER(A2:A10*2,A2:A10>5)'),
+], _FORMULA_CELL, _SPILL_CELL)
 
 
-def test_phase3_spill_with_new_functions(worksheet, write_cell_implementation):
+@pytest.mark.parametrize("cell_ref, formula, spill_range, expected", _PHASE3_NEW_FUNCTION_SPILL_CASES)
+def test_phase3_spill_with_new_functions(worksheet, write_cell_implementation,
+        cell_ref, formula, spill_range, expected):
     """Test Phase 3: Normal operations combined with new spill functions
     
     Tests combinations like UNIQUE(A1:A10)*2 or SORT(A1:A5*B1:B5)
     """
     write_cell = write_cell_implementation
     ws = worksheet
+
+    cell = ws[cell_ref]
+    cell.value = formula
+    cell.set_dynamic_array_formula(spill_range)
     
-    # Test cases combining normal operations with spill functions
-    test_cases = [
-        # スピル関数を含む通常の配列演算
-        ("M2", '=UNIQUE(A2:A11)*2', 'M2:M11', """
-    <c r="M2" cm="1">
-      <f t="array" ref="M2:M11">_xlfn.UNIQUE(A2:A11)*2</f>
-      <v>0</v>
-    </c>"""),
-        
-        # 通常の配列演算をスピル関数に渡す
-        ("N2", '=SORT(A2:A6*B2:B6)', 'N2:N6', """
-    <c r="N2" cm="1">
-      <f t="array" ref="N2:N6">_xlfn._xlws.SORT(A2:A6*B2:B6)</f>
-      <v>0</v>
-    </c>"""),
-        
-        # IF関数とスピル関数の組み合わせ
-        ("O2", '=IF(UNIQUE(A2:A6)>2,UNIQUE(B2:B6),0)', 'O2:O6', """
-    <c r="O2" cm="1">
-      <f t="array" ref="O2:O6">IF(_xlfn.UNIQUE(A2:A6)&gt;2,_xlfn.UNIQUE(B2:B6),0)</f>
-      <v>0</v>
-    </c>"""),
-        
-        # FILTER関数と通常の配列演算
-        ("P2", '=FILTER(A2:A10*2,A2:A10>5)', 'P2:P6', """
-    <c r="P2" cm="1">
-      <f t="array" ref="P2:P6">_xlfn._xlws.FILTER(A2:A10*2,A2:A10&gt;5)</f>
-      <v>0</v>
-    </c>"""),
-    ]
-    
-    # 各テストケースを実行
-    for cell_ref, formula, spill_range, expected in test_cases:
-        cell = ws[cell_ref]
-        cell.value = formula
-        cell._is_spill = True
-        cell._spill_range = spill_range
-        
-        out = BytesIO()
-        with xmlfile(out) as xf:
-            write_cell(xf, ws, cell)
-        
-        xml = out.getvalue()
-        diff = compare_xml(xml, expected)
-        assert diff is None, f"Failed for {formula}: {diff}"
+    xml = serialize_cell(write_cell, ws, cell)
+    diff = compare_xml(xml, expected)
+    assert diff is None, f"Failed for {formula}: {diff}"
+
+
+# Test cases for non-spilling formulas
+_PHASE3_NON_SPILL_CASES = expected_cell_xml([
+    # 通常のSUM関数（スピルしない）
+    ("P2", '=SUM(A2:A6)', 'SUM(A2:A6)'),
+    
+    # 単一セル参照（スピルしない）
+    ("Q2", '=A2*2', 'A2*2'),
+    
+    # AVERAGEも通常はスピルしない
+    ("R2", '=AVERAGE(A2:A6)', 'AVERAGE(A2:A6)'),
+], _FORMULA_CELL, _SPILL_CELL)
 
 
-def test_phase3_non_spill_formulas(worksheet, write_cell_implementation):
+@pytest.mark.parametrize("cell_ref, formula, expected", _PHASE3_NON_SPILL_CASES)
+def test_phase3_non_spill_formulas(worksheet, write_cell_implementation,
+        cell_ref, formula, expected):
     """Test Phase 3: Regular formulas that don't spill
     
     Tests that normal SUM and single cell references don't generate array formulas
     """
     write_cell = write_cell_implementation
     ws = worksheet
-    
-    # Test cases for non-spilling formulas
-    test_cases = [
-        # 通常のSUM関数（スピルしない）
-        ("P2", '=SUM(A2:A6)', """
-    <c r="P2">
-      <f>SUM(A2:A6)</f>
-      <v/>
-    </c>"""),
-        
-        # 単一セル参照（スピルしない）
-        ("Q2", '=A2*2', """
-    <c r="Q2">
-      <f>A2*2</f>
-      <v/>
-    </c>"""),
-        
-        # AVERAGEも通常はスピルしない
-        ("R2", '=AVERAGE(A2:A6)', """
-    <c r="R2">
-      <f>AVERAGE(A2:A6)</f>
-      <v/>
-    </c>"""),
-    ]
-    
-    # 各テストケースを実行
-    for cell_ref, formula, expected in test_cases:
-        cell = ws[cell_ref]
-        cell.value = formula
-        # _is_spillは設定しない（通常の数式）
-        
-        out = BytesIO()
-        with xmlfile(out) as xf:
-            write_cell(xf, ws, cell)
-        
-        xml = out.getvalue()
-        diff = compare_xml(xml, expected)
-        assert diff is None, f"Failed for {formula}: {diff}"
 
+    cell = ws[cell_ref]
+    cell.value = formula
+    # _is_spillは設定しない（通常の数式）
+    
+    xml = serialize_cell(write_cell, ws, cell)
+    diff = compare_xml(xml, expected)
+    assert diff is None, f"Failed for {formula}: {diff}"
@@ -41,6 +41,7 @@ def get_column_interval(start, end):
     return [get_column_letter(x) for x in range(start, end + 1)]
 
 
+@lru_cache(maxsize=16384)
 def coordinate_from_string(coord_string):
     """Convert a coordinate string like 'B12' to a tuple ('B', 12)"""
     match = COORD_RE.match(coord_string)
@@ -136,6 +137,7 @@ def column_index_from_string(col):
     return idx
 
 
+@lru_cache(maxsize=16384)
 def range_boundaries(range_string):
     """
     Convert a range string into a tuple of boundaries: